@@ -123,10 +123,14 @@ class CMMusicGenerator:
 
     Attributes:
         score (music21.stream.Score): The generated score.
+        random (random.Random): The random number generator used to generate
+            the score.  Generators built with the same seed produce the same
+            music.
     """
 
-    def __init__(self):
+    def __init__(self, seed=None):
         self.score = music21.stream.Score()
+        self.random = random.Random(seed)
 
     @staticmethod
     def _get_all_chords(parent):
@@ -201,8 +205,8 @@ class CMStreamGenerator(CMMusicGenerator):
         score = cm_stream_generator.get_score()
     """
 
-    def __init__(self, num_measures):
-        super().__init__()
+    def __init__(self, num_measures, seed=None):
+        super().__init__(seed)
 
         metadata = music21.metadata.Metadata()
         metadata.title = "16ths Stream Practice"
@@ -222,13 +226,13 @@ class CMStreamGenerator(CMMusicGenerator):
         part.insert(0, music21.meter.TimeSignature('4/4'))
 
         # Generate the random notes and add them to the part
-        prev_pitch_idx = random.randint(0, len(pitches_in_range) - 1)
+        prev_pitch_idx = self.random.randint(0, len(pitches_in_range) - 1)
         for measure_idx in range(num_measures):
             measure = music21.stream.Measure(number=measure_idx + 1)
             for _ in range(16):
                 lowest_jump = max(-prev_pitch_idx, -2)
                 highest_jump = min(len(pitches_in_range) - prev_pitch_idx - 1, 2)
-                offset = random.randint(lowest_jump, highest_jump)
+                offset = self.random.randint(lowest_jump, highest_jump)
                 next_pitch_idx = (prev_pitch_idx + offset) % len(pitches_in_range)
                 note = music21.note.Note(pitches_in_range[next_pitch_idx])
                 note.duration.quarterLength = 0.25
@@ -263,15 +267,16 @@ class CMFourFiveStreamGenerator(CMMusicGenerator):
         score (music21.stream.Score): The music21 score containing the generated music.
     """
 
-    def __init__(self, num_measures):
+    def __init__(self, num_measures, seed=None):
         """
         Initialize the CMFourFiveStreamGenerator with the specified number of measures.
 
         Args:
             num_measures (int): The number of measures in the generated stream.
+            seed (int, optional): The seed for the random number generator.
         """
 
-        super().__init__()
+        super().__init__(seed)
 
         metadata = music21.metadata.Metadata()
         metadata.title = "4/5 Stream Practice"
@@ -292,7 +297,7 @@ class CMFourFiveStreamGenerator(CMMusicGenerator):
         for _ in range(num_measures):
             for _ in range(8):
                 # Select next root note
-                step = random.choice([-2, -1, 0, 1, 2])
+                step = self.random.choice([-2, -1, 0, 1, 2])
                 next_index = white_notes.index(current_root) + step
                 if 0 <= next_index < len(white_notes) - 5:
                     pass
@@ -301,7 +306,7 @@ class CMFourFiveStreamGenerator(CMMusicGenerator):
                 current_root = white_notes[next_index]
 
                 # Generate random chord
-                interval = random.choice([3, 4])
+                interval = self.random.choice([3, 4])
                 chord = music21.chord.Chord([current_root, white_notes[next_index+interval]])
                 chord.quarterLength = 0.5
                 right_hand.append(chord)
@@ -347,7 +352,7 @@ class CMChordGenerator(CMMusicGenerator):
         generated chords.
     """
 
-    def __init__(self, notes_per_chord, num_chords, key, both_hands):
+    def __init__(self, notes_per_chord, num_chords, key, both_hands, seed=None):
         """
         Initialize the CMChordGenerator with the specified parameters.
 
@@ -356,9 +361,10 @@ class CMChordGenerator(CMMusicGenerator):
             num_chords (int): The number of chords to generate.
             key (music21.key.Key): The key signature for the chords.
             both_hands (bool): Whether to generate chords for both hands.
+            seed (int, optional): The seed for the random number generator.
         """
 
-        super().__init__()
+        super().__init__(seed)
 
         metadata = music21.metadata.Metadata()
         metadata.title = f"Random {key.name.replace('-', 'b')} Practice"
@@ -467,8 +473,7 @@ class CMChordGenerator(CMMusicGenerator):
 
         return part
 
-    @staticmethod
-    def generate_chord(octaves, num_notes):
+    def generate_chord(self, octaves, num_notes):
         """
         Generate a random chord with the given number of notes within the specified octaves and key.
 
@@ -489,7 +494,7 @@ class CMChordGenerator(CMMusicGenerator):
                                             for octave in octaves]
 
         while True:
-            chord_pitches = random.sample(all_pitches, num_notes)
+            chord_pitches = self.random.sample(all_pitches, num_notes)
             random_chord = music21.chord.Chord(chord_pitches, quarterLength=4)
             random_chord = random_chord.sortChromaticAscending()
 #            random_chord = random_chord.simplifyEnharmonics(keyContext=key)
@@ -0,0 +1,121 @@
+"""
+Tests for the worksheet archive served by xmlserver.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+import re
+import sqlite3
+
+import pytest
+
+import xmlserver
+
+PARAMS = {'notes': 3, 'measures': 2, 'key': 'E', 'both_hands': False, 'seed': 7}
+QUERY = '/xmlgen?notes=3&measures=2&key=E&seed=7'
+
+def pitches(xml):
+    """
+    Extract the notes of a MusicXML worksheet, ignoring ids and dates.
+    """
+    if isinstance(xml, bytes):
+        xml = xml.decode('utf-8')
+    return re.findall(r'<pitch>.*?</pitch>', xml, re.S)
+
+@pytest.fixture(name='archive')
+def fixture_archive(tmp_path, monkeypatch):
+    archive = xmlserver.WorksheetArchive(str(tmp_path), 0)
+    monkeypatch.setattr(xmlserver, 'archive', archive)
+    return archive
+
+@pytest.fixture(name='client')
+def fixture_client(archive):  # pylint: disable=unused-argument
+    return xmlserver.app.test_client()
+
+def test_seed_is_reproducible_across_threads():
+    expected = pitches(xmlserver.generate_worksheet(PARAMS))
+    seeds = [7, 1, 7, 2, 7, 3, 7, 4]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda seed: pitches(xmlserver.generate_worksheet({**PARAMS, 'seed': seed})),
+            seeds))
+    assert expected
+    for seed, result in zip(seeds, results):
+        assert (result == expected) == (seed == 7)
+
+def test_round_trip(client):
+    response = client.get(QUERY)
+    assert response.status_code == 200
+    worksheet_id = response.headers['X-Worksheet-Id']
+    assert response.headers['Content-Location'] == f'/worksheet/{worksheet_id}'
+
+    again = client.get(f'/worksheet/{worksheet_id}')
+    assert again.status_code == 200
+    assert again.data == response.data
+    assert again.headers['ETag'] == response.headers['ETag']
+    assert pitches(again.data) == pitches(xmlserver.generate_worksheet(PARAMS))
+
+    compressed = client.get(f'/worksheet/{worksheet_id}',
+                            headers={'Accept-Encoding': 'gzip'})
+    assert compressed.status_code == 200
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == response.data
+    assert compressed.headers['ETag'] != response.headers['ETag']
+
+def test_unknown_worksheet(client):
+    assert client.get('/worksheet/0123456789abcdef01234567').status_code == 404
+
+@pytest.mark.parametrize('headers', [{}, {'Accept-Encoding': 'gzip'}])
+def test_not_modified(client, headers):
+    response = client.get(QUERY, headers=headers)
+    cached = client.get(response.headers['Content-Location'],
+                        headers={**headers, 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+@pytest.mark.parametrize('headers', [{}, {'Accept-Encoding': 'gzip'}])
+def test_range(client, headers):
+    full = client.get(QUERY, headers=headers)
+    partial = client.get(full.headers['Content-Location'],
+                         headers={**headers, 'Range': 'bytes=0-9'})
+    assert partial.status_code == 206
+    assert partial.data == full.data[:10]
+    assert partial.headers['Content-Range'] == f'bytes 0-9/{len(full.data)}'
+
+def test_eviction_and_regeneration(client, archive):
+    archive.max_bytes = 1
+    first = client.get(QUERY)
+    second = client.get(QUERY.replace('seed=7', 'seed=8'),
+                        headers={'Accept-Encoding': 'gzip'})
+    assert second.status_code == 200
+
+    first_id = first.headers['X-Worksheet-Id']
+    assert archive.lookup(first_id)[1] is None
+    assert archive.lookup(second.headers['X-Worksheet-Id'])[1] is not None
+
+    regenerated = client.get(f'/worksheet/{first_id}')
+    assert regenerated.status_code == 200
+    assert pitches(regenerated.data) == pitches(first.data)
+
+    with sqlite3.connect(os.path.join(archive.directory, 'index.sqlite3')) as db:
+        total = db.execute("SELECT size FROM totals").fetchone()[0]
+        assert total == db.execute("SELECT SUM(size) FROM worksheets").fetchone()[0]
+
+def test_file_evicted_by_another_worker(client, archive):
+    first = client.get(QUERY)
+    worksheet_id = first.headers['X-Worksheet-Id']
+    os.remove(archive.path(worksheet_id, archive.lookup(worksheet_id)[1]))
+
+    response = client.get(f'/worksheet/{worksheet_id}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert pitches(gzip.decompress(response.data)) == pitches(first.data)
+
+def test_forgotten_after_ttl(client, archive, monkeypatch):
+    monkeypatch.setattr(archive, 'ROW_TTL', -1)
+    archive.max_bytes = 1
+    first = client.get(QUERY)
+    client.get(QUERY.replace('seed=7', 'seed=8'))
+    assert client.get(first.headers['Content-Location']).status_code == 404
+
+def test_minimum_size(archive):
+    assert archive.max_bytes == xmlserver.WorksheetArchive.MIN_BYTES
@@ -3,11 +3,23 @@ Module for serving XML files from chordmania using Flask.
 
 This module sets up a Flask web server to serve static files and dynamically
 generated XML files from chordmania.
+
+If the CHORDMANIA_ARCHIVE environment variable names a directory, generated
+worksheets are also kept in a persistent archive there so that they can be
+reopened (or shared) via /worksheet/<id> without being regenerated.
 """
 
+from contextlib import closing
+import gzip
+import hashlib
+import json
 import os
+import secrets
+import sqlite3
+import tempfile
+import time
 
-from flask import Flask, request, send_from_directory
+from flask import Flask, Response, request, send_file, send_from_directory
 import music21
 
 import sys; sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -15,6 +27,270 @@ import chordmania
 
 app = Flask(__name__, static_folder='client')
 
+class WorksheetArchive:
+    """
+    A persistent, content-addressed store of generated worksheets.
+
+    Each worksheet is identified by a hash of the parameters and random seed
+    used to generate it.  The MusicXML is kept gzip-compressed in a file named
+    after that id and a digest of the compressed bytes, and a small SQLite
+    index records the parameters, digest, compressed size and last access time
+    of every worksheet, along with a running total of the stored bytes.  The
+    index and the files live in the same directory, so the archive can be
+    shared by every gunicorn worker on the machine: SQLite serializes the
+    writers, and files are only ever moved into place with an atomic rename.
+
+    When the compressed files grow beyond `max_bytes`, the least recently used
+    ones are deleted.  Their index rows (and therefore their permalinks) are
+    kept for `ROW_TTL` seconds after their last access, so a recently evicted
+    worksheet is simply regenerated from its seed the next time it is
+    requested.
+
+    Attributes:
+        directory (str): The directory holding the index and the files.
+        max_bytes (int): The maximum total size of the compressed files.
+    """
+
+    # The smallest allowed `max_bytes`, comfortably larger than any single
+    # compressed worksheet.
+    MIN_BYTES = 1024 * 1024
+
+    # Don't rewrite a row's access time more often than this (in seconds) so
+    # that bursts of hits on the same worksheet stay read-only.
+    TOUCH_INTERVAL = 60
+
+    # How long (in seconds) to remember the parameters of an evicted worksheet.
+    ROW_TTL = 30 * 24 * 3600
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max(max_bytes, self.MIN_BYTES)
+        if max_bytes < self.MIN_BYTES:
+            app.logger.warning("Worksheet archive size raised to the minimum of %d bytes",
+                               self.MIN_BYTES)
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS worksheets (
+                    id TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    digest TEXT,
+                    size INTEGER,
+                    accessed REAL NOT NULL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS worksheets_accessed ON worksheets (accessed)")
+            db.execute("CREATE TABLE IF NOT EXISTS totals (size INTEGER NOT NULL)")
+            db.execute("INSERT INTO totals SELECT 0 WHERE NOT EXISTS (SELECT * FROM totals)")
+            db.execute("COMMIT")
+
+    def _connect(self):
+        return sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'),
+                               timeout=30, isolation_level=None)
+
+    def path(self, worksheet_id, digest):
+        """
+        Return the path of the compressed file for the given worksheet.
+        """
+        return os.path.join(self.directory, f'{worksheet_id}-{digest}.xml.gz')
+
+    @staticmethod
+    def make_id(params):
+        """
+        Compute the content-addressed id of a worksheet.
+
+        Args:
+            params (dict): The generation parameters, including the seed.
+
+        Returns:
+            str: A hex digest that uniquely identifies the worksheet.
+        """
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:24]
+
+    def lookup(self, worksheet_id):
+        """
+        Look up a worksheet in the index, marking it as recently used.
+
+        Args:
+            worksheet_id (str): The worksheet id.
+
+        Returns:
+            tuple: The worksheet's parameters (dict) and the digest of its
+                   compressed file (str), or None in place of the digest if
+                   the file isn't currently stored.  None if the id is unknown.
+        """
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT params, digest, accessed FROM worksheets WHERE id = ?",
+                             (worksheet_id,)).fetchone()
+            if row is None:
+                return None
+            params, digest, accessed = row
+            now = time.time()
+            if now - accessed > self.TOUCH_INTERVAL:
+                db.execute("UPDATE worksheets SET accessed = ? WHERE id = ?",
+                           (now, worksheet_id))
+        return json.loads(params), digest
+
+    def store(self, worksheet_id, params, xml):
+        """
+        Compress and store a worksheet, then evict old ones if necessary.
+
+        If another worker has already stored the same worksheet, the stored
+        copy is left alone.
+
+        Args:
+            worksheet_id (str): The worksheet id.
+            params (dict): The generation parameters, including the seed.
+            xml (str): The generated MusicXML.
+
+        Returns:
+            tuple: The digest (str) and contents (bytes) of the compressed
+                   worksheet.  The file itself may already have been evicted.
+        """
+        payload = gzip.compress(xml.encode('utf-8'), mtime=0)
+        digest = hashlib.sha256(payload).hexdigest()[:24]
+
+        # Write the file outside of the lock, then move it into place while
+        # holding the database's write lock.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(payload)
+
+            with closing(self._connect()) as db:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    row = db.execute("SELECT digest, size FROM worksheets WHERE id = ?",
+                                     (worksheet_id,)).fetchone()
+                    old_digest, old_size = row if row is not None else (None, None)
+                    if old_digest is None or not os.path.exists(self.path(worksheet_id,
+                                                                          old_digest)):
+                        os.replace(tmp_path, self.path(worksheet_id, digest))
+                        db.execute("INSERT OR REPLACE INTO worksheets VALUES (?, ?, ?, ?, ?)",
+                                   (worksheet_id, json.dumps(params), digest, len(payload),
+                                    time.time()))
+                        db.execute("UPDATE totals SET size = size + ?",
+                                   (len(payload) - (old_size or 0),))
+                        self._evict(db, worksheet_id)
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return digest, payload
+
+    def _evict(self, db, keep):
+        """
+        Delete the least recently used files (other than `keep`'s) until the
+        archive fits in `max_bytes`, and forget worksheets that haven't been
+        used for `ROW_TTL` seconds.  Must be called while holding the write lock.
+        """
+        total = db.execute("SELECT size FROM totals").fetchone()[0]
+        while total > self.max_bytes:
+            victims = db.execute(
+                    "SELECT id, digest, size FROM worksheets "
+                    "WHERE digest IS NOT NULL AND id != ? ORDER BY accessed LIMIT 16",
+                    (keep,)).fetchall()
+            if not victims:
+                break
+            for worksheet_id, digest, size in victims:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.path(worksheet_id, digest))
+                except FileNotFoundError:
+                    pass
+                db.execute("UPDATE worksheets SET digest = NULL, size = NULL WHERE id = ?",
+                           (worksheet_id,))
+                db.execute("UPDATE totals SET size = size - ?", (size,))
+                total -= size
+
+        db.execute("DELETE FROM worksheets WHERE accessed < ? AND digest IS NULL",
+                   (time.time() - self.ROW_TTL,))
+
+archive = None
+if os.environ.get('CHORDMANIA_ARCHIVE'):
+    archive = WorksheetArchive(
+            os.environ['CHORDMANIA_ARCHIVE'],
+            int(os.environ.get('CHORDMANIA_ARCHIVE_MAX_BYTES', 256 * 1024 * 1024)))
+
+def generate_worksheet(params):
+    """
+    Generate the MusicXML for a worksheet.
+
+    The same parameters (including the seed) always produce the same chords.
+
+    Args:
+    params (dict): The generation parameters, including the seed.
+
+    Returns:
+    str: The generated MusicXML.
+    """
+    chord_generator = chordmania.CMChordGenerator(params['notes'],
+                                                  params['measures'],
+                                                  music21.key.Key(params['key']),
+                                                  params['both_hands'],
+                                                  seed=params['seed'])
+    return chord_generator.get_xml()
+
+def serve_worksheet(worksheet_id, params, digest):
+    """
+    Serve a worksheet from the archive, generating and storing it if needed.
+
+    Clients that accept gzip get the compressed file as-is, which lets the WSGI
+    server send it straight from disk.  Either way the response carries an
+    ETag derived from the stored bytes and supports conditional and Range
+    requests.
+
+    Args:
+    worksheet_id (str): The worksheet id.
+    params (dict): The generation parameters, including the seed.
+    digest (str): The digest of the stored file, or None if it isn't stored.
+
+    Returns:
+    Response: A Flask response object serving the worksheet.
+    """
+    use_gzip = request.accept_encodings['gzip'] > 0
+    response = None
+    payload = None
+
+    if digest is not None:
+        try:
+            if use_gzip:
+                response = send_file(archive.path(worksheet_id, digest),
+                                     mimetype='application/xml',
+                                     etag=f'{digest}-gz')
+            else:
+                with open(archive.path(worksheet_id, digest), 'rb') as f:
+                    payload = f.read()
+        except FileNotFoundError:
+            # Evicted (possibly by another worker) since the lookup.
+            digest = None
+
+    if digest is None:
+        digest, payload = archive.store(worksheet_id, params, generate_worksheet(params))
+
+    if response is None:
+        # Serve from memory, since the file may be evicted at any moment.
+        if use_gzip:
+            body, etag = payload, f'{digest}-gz'
+        else:
+            body, etag = gzip.decompress(payload), digest
+        response = Response(body, mimetype='application/xml')
+        response.set_etag(etag)
+        response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Location'] = f'/worksheet/{worksheet_id}'
+    response.headers['X-Worksheet-Id'] = worksheet_id
+    return response
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -50,6 +326,9 @@ def generate_xml():
     This function generates an XML file containing a series of chords based on
     user-provided parameters like notes per chord, number of chords, key signature,
     and whether to use both hands. The generated XML is returned to the user.
+    An optional 'seed' parameter makes the worksheet reproducible; when the
+    archive is enabled, the worksheet is also stored and its permalink is
+    returned in the Content-Location header.
 
     Returns:
     tuple: XML content, HTTP status code, and content type.
@@ -66,11 +345,41 @@ def generate_xml():
     both_hands = request.args.get('both_hands', default=both_hands,
                                   type=lambda x: x.lower() == 'true')
 
-    chord_generator = chordmania.CMChordGenerator(notes_per_chord,
-                                                  num_chords,
-                                                  music21.key.Key(key_signature),
-                                                  both_hands)
-    return chord_generator.get_xml(), 200, {'Content-Type': 'application/xml'}
+    seed = request.args.get('seed', default=secrets.randbits(32), type=int)
+
+    params = {
+        'notes': notes_per_chord,
+        'measures': num_chords,
+        'key': key_signature,
+        'both_hands': both_hands,
+        'seed': seed,
+    }
+    if archive is None:
+        return generate_worksheet(params), 200, {'Content-Type': 'application/xml'}
+
+    worksheet_id = WorksheetArchive.make_id(params)
+    entry = archive.lookup(worksheet_id)
+    return serve_worksheet(worksheet_id, params, entry[1] if entry else None)
+
+@app.route('/worksheet/<worksheet_id>')
+def get_worksheet(worksheet_id):
+    """
+    Serve a previously generated worksheet from the archive.
+
+    Args:
+    worksheet_id (str): The id returned by '/xmlgen' in the X-Worksheet-Id header.
+
+    Returns:
+    Response: A Flask response object serving the worksheet, or a 404 error
+              response if the archive is disabled or the id is unknown.
+    """
+    if archive is None:
+        return "Not Found", 404
+    entry = archive.lookup(worksheet_id)
+    if entry is None:
+        return "Not Found", 404
+    params, digest = entry
+    return serve_worksheet(worksheet_id, params, digest)
 
 if __name__ == '__main__':
     # Airplay Receiver is using localhost:5000 for whatever reason.